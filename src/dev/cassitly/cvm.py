@@ -1,12 +1,223 @@
 # cvm.py
+import asyncio
+import collections
+import contextlib
+import itertools
 import json
 import os
+import queue
+import socket
 import subprocess
+import sys
 import threading
-import uuid
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    # json.loads() won't take a memoryview, so copy the frame out once.
+    def _loads(data: Any) -> Any:
+        return json.loads(bytes(data))
+
+DELIM = b"\n\n"
+# Bytes requested from the bridge's stdout per read() syscall.
+READ_SIZE = 1 << 16
+# Consumed bytes are only dropped from the read buffer once they exceed this.
+COMPACT_THRESHOLD = 1 << 20
+# Number of independently locked shards the pending-call tables are split into
+# (must be a power of two).
+SHARDS = 16
+# Largest number of buffers handed to a single writev() call.
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+# Bridge methods whose results CVM may cache, keyed by (method, path).
+CACHED_METHODS = frozenset({"stat", "exists", "statAsync"})
+# Methods that never change VFS state, so they leave the cache alone.
+READ_METHODS = CACHED_METHODS | {"readFile", "readdir", "save", "readFileAsync", "readdirAsync"}
+# Methods that only change the file at params[0].
+CONTENT_METHODS = frozenset({"writeFile", "appendFile"})
+# Methods that create or remove the entry at params[0] (and may touch its
+# ancestors). Any other non-read method, e.g. load, drops the whole cache.
+ENTRY_METHODS = frozenset({
+    "createFile", "unlink", "mkdir",
+    "createFileAsync", "unlinkAsync", "mkdirAsync",
+})
+RENAME_METHODS = frozenset({"rename", "renameAsync"})
+# Methods CVMPool.call sends to every worker, returning the first result.
+BROADCAST_METHODS = frozenset({"load"})
+# Most (method, path) entries kept in the stat cache.
+STAT_CACHE_SIZE = 4096
+# Params of these types are sent as raw attachments rather than JSON.
+BINARY_TYPES = (bytes, bytearray, memoryview)
+# Kernel buffer size requested for the bridge connection (pipes or sockets),
+# so large responses need fewer blocking writes and reader wakeups.
+CHANNEL_BUFFER_SIZE = 1 << 20
+# pass_fds (and a real AF_UNIX socketpair) are POSIX-only.
+HAS_SOCKETPAIR = os.name == "posix" and hasattr(socket, "AF_UNIX")
+# Upper bound on how many queued messages the writer coalesces into one write.
+MAX_BATCH = 64
+
+
+class _FrameDecoder:
+    """
+    Splits the bridge's output stream into DELIM-terminated JSON frames and
+    yields the response objects they contain.
+
+    A response carrying `"binlen": N` has its result sent out-of-band: the
+    frame is followed by N raw bytes (one run per such response, in order),
+    which become the response's `result`.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        # `start` is the beginning of the current (unparsed) frame; everything
+        # between `start` and `scan` is known not to contain a delimiter.
+        self.start = 0
+        self.scan = 0
+        # Replies parsed from the last frame, waiting for `need` raw bytes.
+        self.waiting: Optional[Tuple[List[Dict[str, Any]], int]] = None
+
+    def feed(self, chunk: bytes) -> Iterator[Dict[str, Any]]:
+        buf = self.buf
+        buf.extend(chunk)
+        while True:
+            if self.waiting is not None:
+                replies, need = self.waiting
+                if len(buf) - self.start < need:
+                    break
+                offset = self.start
+                with memoryview(buf) as view:
+                    for reply in replies:
+                        size = reply.get("binlen")
+                        if isinstance(size, int):
+                            reply["result"] = view[offset:offset + size].tobytes()
+                            offset += size
+                self.start = self.scan = offset
+                self.waiting = None
+                yield from replies
+                continue
+            idx = buf.find(DELIM, self.scan)
+            if idx == -1:
+                self.scan = max(self.start, len(buf) - len(DELIM) + 1)
+                break
+            try:
+                # Parse straight out of the buffer; the views are released
+                # before the buffer is resized again.
+                with memoryview(buf) as view, view[self.start:idx] as frame:
+                    msg = _loads(frame)
+            except Exception:
+                continue
+            finally:
+                self.start = self.scan = idx + len(DELIM)
+            # A JSON array is the bridge's reply to a batch request.
+            replies = [
+                reply for reply in (msg if isinstance(msg, list) else (msg,))
+                if isinstance(reply, dict)
+            ]
+            sizes = [
+                reply["binlen"] for reply in replies
+                if isinstance(reply.get("binlen"), int)
+            ]
+            if sizes:
+                self.waiting = (replies, sum(sizes))
+                continue
+            yield from replies
+        if self.start == len(buf):
+            buf.clear()
+            self.start = self.scan = 0
+        elif self.start > COMPACT_THRESHOLD:
+            del buf[:self.start]
+            self.scan -= self.start
+            self.start = 0
+
+
+def _normpath(path: str) -> str:
+    # Same normalization VirtualFS applies: split on "/" and drop empties.
+    return "/" + "/".join(part for part in path.split("/") if part)
+
+
+def _path_related(a: str, b: str) -> bool:
+    # True if normalized paths `a` and `b` are equal or one contains the other.
+    if a == b or a == "/" or b == "/":
+        return True
+    return a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def _build_request(
+    msg_id: int,
+    method: str,
+    params: List[Any],
+    binary: bool = False,
+) -> Tuple[Dict[str, Any], List[Any]]:
+    """
+    Build a request dict, moving bytes-like params out of the JSON and
+    returning them as attachments to send after the frame.
+    """
+    payload: Dict[str, Any] = {"id": msg_id, "method": method, "params": params}
+    blobs: List[Any] = []
+    if any(isinstance(p, BINARY_TYPES) for p in params):
+        params = list(params)
+        sizes = []
+        for i, p in enumerate(params):
+            if isinstance(p, BINARY_TYPES):
+                view = memoryview(p)
+                if not view.c_contiguous:
+                    # The writer needs flat buffers; copy strided views here,
+                    # in the caller's thread, rather than fail in the writer.
+                    p = view.tobytes()
+                    view = memoryview(p)
+                params[i] = None
+                sizes.append([i, view.nbytes])
+                blobs.append(p)
+        payload["params"] = params
+        payload["bin"] = sizes
+    if binary:
+        payload["binary"] = True
+    return payload, blobs
+
+
+def _grow_pipe(fd: int):
+    # Linux-only; other platforms (or a lower pipe-max-size) keep the default.
+    if not sys.platform.startswith("linux"):
+        return
+    import fcntl
+
+    try:
+        fcntl.fcntl(fd, getattr(fcntl, "F_SETPIPE_SZ", 1031), CHANNEL_BUFFER_SIZE)
+    except OSError:
+        pass
+
+
+def _grow_socket_buffers(sock: socket.socket):
+    # The kernel clamps these to its configured maximums.
+    for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, CHANNEL_BUFFER_SIZE)
+        except OSError:
+            pass
+
+
+class _Shard:
+    """
+    One slice of CVM's pending-call tables, guarded by its own lock.
+    """
+
+    __slots__ = ("lock", "waiters", "results")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters: Dict[int, threading.Event] = {}
+        self.results: Dict[int, Dict[str, Any]] = {}
 
-DELIM = "\n\n"
 
 class CVMConfig:
     def __init__(
@@ -15,84 +226,709 @@ class CVMConfig:
         bridge_js: str = "dist/bridge.js",
         cwd: Optional[str] = None,
         env: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        use_socketpair: bool = True,
+        stat_cache_ttl: float = 1.0,
     ):
         self.node_path = node_path
         self.bridge_js = bridge_js
         self.cwd = cwd
-        self.env = env or os.environ.copy()
+        # None lets the bridge inherit this process's environment; to tweak it,
+        # pass a modified copy, e.g. env=dict(os.environ, FOO="bar").
+        self.env = env
+        # Seconds to wait for a response; None waits forever.
+        self.timeout = timeout
+        # Talk to the bridge over a full-duplex AF_UNIX socketpair instead of
+        # its stdin/stdout. Ignored (stdio is used) where unsupported.
+        self.use_socketpair = use_socketpair
+        # Seconds a stat/exists result may be served from cache; 0 disables it.
+        self.stat_cache_ttl = stat_cache_ttl
 
 
 class CVM:
     """
     Cassitly VM bridge: manages a Node subprocess and JSON-RPC communication.
-    It does not know about VirtualFS or any specific API.
+    It does not know about VirtualFS internals; the only method names it
+    relies on are those driving the stat/exists cache and batch_appends().
     """
 
     def __init__(self, config: CVMConfig):
         self.config = config
-        self.proc = subprocess.Popen(
-            [self.config.node_path, self.config.bridge_js],
-            cwd=self.config.cwd,
-            env=self.config.env,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-        )
-        self._lock = threading.Lock()
-        self._responses: Dict[str, Dict[str, Any]] = {}
+        self._sock: Optional[socket.socket] = None
+        child: Optional[socket.socket] = None
+        argv = [self.config.node_path, self.config.bridge_js]
+        if self.config.use_socketpair and HAS_SOCKETPAIR:
+            # The bridge finds its end of the pair through --fd; its own
+            # stdout is then free for logging and is discarded.
+            self._sock, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            for sock in (self._sock, child):
+                _grow_socket_buffers(sock)
+            argv.append(f"--fd={child.fileno()}")
+            stdio = dict(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, pass_fds=(child.fileno(),))
+        else:
+            stdio = dict(stdin=subprocess.PIPE, stdout=subprocess.PIPE, pass_fds=())
+        try:
+            # close_fds is explicit so only the fds in pass_fds leak into
+            # the bridge.
+            self.proc = subprocess.Popen(
+                argv,
+                cwd=self.config.cwd,
+                env=self.config.env,
+                stderr=subprocess.PIPE,
+                close_fds=True,
+                text=False,
+                bufsize=0,
+                **stdio,
+            )
+        finally:
+            if child is not None:
+                child.close()
+        if self._sock is not None:
+            self._read_fd = self._write_fd = self._sock.fileno()
+        else:
+            self._read_fd = self.proc.stdout.fileno()
+            self._write_fd = self.proc.stdin.fileno()
+            for fd in (self._read_fd, self._write_fd):
+                _grow_pipe(fd)
+        self._id_gen = itertools.count(1)
+        # Pending calls are spread over shards by id so callers and the reader
+        # rarely contend on the same lock.
+        self._shards = [_Shard() for _ in range(SHARDS)]
+        self._closed = False
+        # Per-thread appends buffered by batch_appends().
+        self._local = threading.local()
+        self._outbox: "queue.Queue[Optional[List[Any]]]" = queue.Queue()
+        # (method, normalized path) -> (expiry, result) for CACHED_METHODS.
+        # Every invalidation bumps _cache_gen; a result is only stored if no
+        # invalidation happened while its call was in flight.
+        self._cache_ttl = self.config.stat_cache_ttl
+        self._stat_cache: "collections.OrderedDict[Tuple[str, str], Tuple[float, Any]]" = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_gen = 0
         self._reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
         self._reader_thread.start()
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
 
     def close(self):
         if self.proc and self.proc.poll() is None:
+            # The writer owns the write side: it closes the socket (or stdin)
+            # once it has stopped, so no thread writes to a recycled fd.
+            self._outbox.put(None)
+            try:
+                if self._sock is not None:
+                    # Wakes the reader with EOF.
+                    self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
-                self.proc.stdin.close()
                 self.proc.terminate()
             except Exception:
                 pass
 
     def _reader_loop(self):
-        buf = ""
+        fd = self._read_fd
+        decoder = _FrameDecoder()
         while True:
-            if self.proc.stdout is None:
+            try:
+                chunk = os.read(fd, READ_SIZE)
+            except OSError:
                 break
-            chunk = self.proc.stdout.read(1)
             if not chunk:
                 break
-            buf += chunk
-            while True:
-                idx = buf.find(DELIM)
-                if idx == -1:
-                    break
-                raw = buf[:idx]
-                buf = buf[idx + len(DELIM):]
-                try:
-                    msg = json.loads(raw)
-                except Exception:
-                    continue
-                msg_id = str(msg.get("id"))
-                with self._lock:
-                    self._responses[msg_id] = msg
+            for reply in decoder.feed(chunk):
+                self._deliver(reply)
+        self._fail_pending()
+        self._outbox.put(None)
 
-    def call(self, method: str, params: List[Any]) -> Any:
+    def _fail_pending(self):
+        # Bridge is gone: wake everyone still waiting so they can fail.
+        self._closed = True
+        for shard in self._shards:
+            with shard.lock:
+                waiters = list(shard.waiters.values())
+                shard.waiters.clear()
+            for ev in waiters:
+                ev.set()
+
+    def _deliver(self, msg: Dict[str, Any]):
+        msg_id = msg.get("id")
+        if not isinstance(msg_id, int):
+            return
+        shard = self._shard(msg_id)
+        with shard.lock:
+            ev = shard.waiters.pop(msg_id, None)
+            # Nobody is waiting (timed out or abandoned): drop it. A stored
+            # result is always collected, and removed, by its caller's _wait.
+            if ev is not None:
+                shard.results[msg_id] = msg
+        if ev is not None:
+            ev.set()
+
+    def _writer_loop(self):
+        try:
+            self._drain_outbox()
+        except BaseException:
+            # Never leave callers blocked on a writer that died; the error
+            # itself is still reported by threading.excepthook.
+            self._fail_pending()
+            raise
+        finally:
+            self._close_write_side()
+
+    def _drain_outbox(self):
         """
-        Generic RPC call into the Node bridge.
+        Drain the outbox, coalescing whatever is already queued into a single
+        writev() so bursts of calls cost one wakeup of the bridge instead of N.
         """
-        if self.proc.stdin is None:
-            raise RuntimeError("Bridge stdin not available")
-        msg_id = str(uuid.uuid4())
-        payload = {"id": msg_id, "method": method, "params": params}
-        self.proc.stdin.write(json.dumps(payload) + DELIM)
-        self.proc.stdin.flush()
-
-        # Wait for response
         while True:
-            with self._lock:
-                if msg_id in self._responses:
-                    msg = self._responses.pop(msg_id)
+            item = self._outbox.get()
+            if item is None:
+                break
+            parts = list(item)
+            count = 1
+            stop = False
+            while count < MAX_BATCH:
+                try:
+                    item = self._outbox.get_nowait()
+                except queue.Empty:
                     break
+                if item is None:
+                    stop = True
+                    break
+                parts.extend(item)
+                count += 1
+            try:
+                self._write_all(parts)
+            except (OSError, ValueError):
+                break
+            if stop:
+                break
+
+    def _close_write_side(self):
+        if self._sock is not None:
+            # Reader and writer share the socket: make sure the reader has
+            # seen EOF and returned before its fd can be reused.
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._reader_thread.join()
+            self._sock.close()
+        else:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def _write_all(self, parts: List[Any]):
+        """
+        Write `parts` to the bridge without joining them, using one
+        writev() per IOV_MAX buffers. Partial writes are resumed.
+        """
+        fd = self._write_fd
+        if not hasattr(os, "writev"):
+            view = memoryview(b"".join(parts))
+            while view:
+                view = view[os.write(fd, view):]
+            return
+        pending = [memoryview(p).cast("B") for p in parts]
+        i = 0
+        while i < len(pending):
+            written = os.writev(fd, pending[i:i + IOV_MAX])
+            # Skip fully written (and empty) parts, then trim a partial one.
+            while i < len(pending) and written >= len(pending[i]):
+                written -= len(pending[i])
+                i += 1
+            if written:
+                pending[i] = pending[i][written:]
+
+    def _encode(self, method: str, params: List[Any], binary: bool = False) -> Tuple[int, List[Any]]:
+        """
+        Encode a single request as the parts to write: the JSON body, DELIM,
+        then any binary attachments.
+        """
+        # next() on itertools.count is atomic under the GIL.
+        payload, blobs = _build_request(next(self._id_gen), method, params, binary)
+        return payload["id"], [_dumps(payload), DELIM, *blobs]
+
+    def _submit(self, parts: List[Any]):
+        # `parts` must hold complete frames (with their attachments), so the
+        # writer never splits a message from its trailing bytes. Once the
+        # bridge is gone nothing is queued: the writer may have stopped, and
+        # the caller's waiter is woken by _register() or the reader's sweep.
+        if self._closed:
+            return
+        self._outbox.put(parts)
+
+    def _shard(self, msg_id: int) -> _Shard:
+        return self._shards[msg_id & (SHARDS - 1)]
+
+    def _register(self, msg_id: int) -> threading.Event:
+        ev = threading.Event()
+        shard = self._shard(msg_id)
+        with shard.lock:
+            # The reader sets _closed before sweeping each shard under its
+            # lock, so a waiter added here is either swept or sees the flag.
+            if self._closed:
+                ev.set()
+            else:
+                shard.waiters[msg_id] = ev
+        return ev
+
+    def _discard(self, msg_ids: List[int]):
+        for msg_id in msg_ids:
+            shard = self._shard(msg_id)
+            with shard.lock:
+                shard.waiters.pop(msg_id, None)
+                shard.results.pop(msg_id, None)
+
+    def _wait(self, msg_id: int, ev: threading.Event, timeout: Optional[float]) -> Dict[str, Any]:
+        try:
+            if not ev.wait(timeout):
+                raise TimeoutError(f"No response from bridge for call {msg_id}")
+            shard = self._shard(msg_id)
+            with shard.lock:
+                msg = shard.results.get(msg_id)
+            if msg is None:
+                raise RuntimeError("Bridge closed before responding")
+            return msg
+        finally:
+            self._discard([msg_id])
+
+    @staticmethod
+    def _unwrap(msg: Dict[str, Any]) -> Any:
         if "error" in msg and msg["error"]:
             raise RuntimeError(msg["error"].get("message", "Unknown error"))
         return msg.get("result")
+
+    def call(self, method: str, params: List[Any], binary: bool = False) -> Any:
+        """
+        Generic RPC call into the Node bridge.
+
+        bytes-like params are shipped as raw attachments after the JSON frame
+        instead of being JSON-escaped; the bridge hands them to the method as
+        UTF-8 decoded strings, since VirtualFS content is text; bytes that
+        are not valid UTF-8 fail the call with a RuntimeError. With
+        `binary=True` a string or Buffer result is returned as raw `bytes`
+        (UTF-8 for strings) the same way.
+        """
+        appends = getattr(self._local, "appends", None)
+        if appends is not None:
+            if (
+                method == "appendFile"
+                and len(params) == 2
+                and isinstance(params[0], str)
+                and isinstance(params[1], str)
+            ):
+                # Keyed like the cache, so aliases such as "f" and "/f"
+                # share one buffer and keep their relative order.
+                appends.setdefault(_normpath(params[0]), []).append(params[1])
+                return None
+            self._flush_appends()
+        cache_key = None
+        if method in CACHED_METHODS and self._cache_ttl > 0 and params and isinstance(params[0], str):
+            cache_key = (method, _normpath(params[0]))
+            hit, result = self._cache_get(cache_key)
+            if hit:
+                return result
+            gen = self._cache_gen
+        self._invalidate_for(method, params)
+        msg_id, parts = self._encode(method, params, binary)
+        ev = self._register(msg_id)
+        self._submit(parts)
+        try:
+            result = self._unwrap(self._wait(msg_id, ev, self.config.timeout))
+        finally:
+            # Again after completion; see _collect.
+            self._invalidate_for(method, params)
+        if cache_key is not None:
+            self._cache_put(cache_key, result, gen)
+        return result
+
+    def call_many(self, calls: List[Tuple[str, List[Any]]], binary: bool = False) -> List[Any]:
+        """
+        Submit several RPC calls as a single batch frame and wait for all of
+        them. Results are returned in the same order as `calls`; the first
+        error encountered (in that order) is raised.
+
+        The batch is sent as one JSON array of request objects, and the
+        bridge answers with one JSON array of responses (in any order),
+        matched back up by id. Binary params and `binary` behave as in
+        `call`; attachments follow the array frame in request order.
+        """
+        self._flush_appends()
+        return self._collect(self._submit_many(calls, binary), calls)
+
+    @contextlib.contextmanager
+    def batch_appends(self) -> Iterator[None]:
+        """
+        Coalesce `call("appendFile", [path, text])` calls made by this thread
+        inside the block: all appends to the same path (compared after
+        normalization, so "f" and "/f" are one path) are joined into one
+        appendFile with the concatenated text, even if other paths were
+        appended to in between.
+
+        Appends for a given path keep their order; the order in which
+        different paths are written is unspecified. Buffered appends are
+        flushed (as one batch) before any other call made inside the block,
+        so reads still observe them, and when the block exits. Errors such
+        as a missing file therefore surface at flush time, not from the
+        appendFile call itself. Nested blocks join the outermost one.
+        """
+        if getattr(self._local, "appends", None) is not None:
+            yield
+            return
+        self._local.appends = {}
+        try:
+            yield
+        finally:
+            try:
+                self._flush_appends()
+            finally:
+                self._local.appends = None
+
+    def _flush_appends(self):
+        appends = getattr(self._local, "appends", None)
+        if not appends:
+            return
+        # Reset before sending so the batch itself isn't captured again.
+        self._local.appends = {}
+        calls = [("appendFile", [path, "".join(chunks)]) for path, chunks in appends.items()]
+        self._collect(self._submit_many(calls), calls)
+
+    def set_cache_ttl(self, ttl: float):
+        """
+        Change how long stat/exists results are cached; 0 disables caching.
+        """
+        self._cache_ttl = ttl
+        if ttl <= 0:
+            self.invalidate()
+
+    def invalidate(self, path: Optional[str] = None):
+        """
+        Drop cached stat/exists results for `path`, its ancestors and its
+        descendants, or everything if `path` is None.
+        """
+        with self._cache_lock:
+            self._cache_gen += 1
+            if path is None:
+                self._stat_cache.clear()
+                return
+            path = _normpath(path)
+            stale = [
+                key for key in self._stat_cache
+                if _path_related(key[1], path)
+            ]
+            for key in stale:
+                del self._stat_cache[key]
+
+    def _cache_get(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        with self._cache_lock:
+            entry = self._stat_cache.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._stat_cache[key]
+                return False, None
+            self._stat_cache.move_to_end(key)
+        result = entry[1]
+        # Hand out copies so callers can't modify the cached stat dict.
+        return True, dict(result) if isinstance(result, dict) else result
+
+    def _cache_put(self, key: Tuple[str, str], result: Any, gen: int):
+        with self._cache_lock:
+            if gen != self._cache_gen:
+                return
+            self._stat_cache[key] = (time.monotonic() + self._cache_ttl, result)
+            self._stat_cache.move_to_end(key)
+            while len(self._stat_cache) > STAT_CACHE_SIZE:
+                self._stat_cache.popitem(last=False)
+
+    def _invalidate_for(self, method: str, params: List[Any]):
+        """
+        Drop whatever cached results a call to `method` could make stale.
+        """
+        if method in READ_METHODS:
+            return
+        paths = [p for p in params[:2] if isinstance(p, str)] if params else []
+        if method in CONTENT_METHODS and paths:
+            self._invalidate_entries([paths[0]], ancestors=False)
+        elif method in ENTRY_METHODS and paths:
+            self._invalidate_entries([paths[0]], ancestors=True)
+        elif method in RENAME_METHODS and len(paths) == 2:
+            for path in paths:
+                self.invalidate(path)
+        else:
+            self.invalidate()
+
+    def _invalidate_entries(self, paths: List[str], ancestors: bool):
+        with self._cache_lock:
+            self._cache_gen += 1
+            for path in paths:
+                path = _normpath(path)
+                targets = [path]
+                if ancestors:
+                    while path != "/":
+                        path = path.rsplit("/", 1)[0] or "/"
+                        targets.append(path)
+                for target in targets:
+                    for method in CACHED_METHODS:
+                        self._stat_cache.pop((method, target), None)
+
+    def _submit_many(
+        self,
+        calls: List[Tuple[str, List[Any]]],
+        binary: bool = False,
+    ) -> List[Tuple[int, threading.Event]]:
+        if not calls:
+            return []
+        for method, params in calls:
+            self._invalidate_for(method, params)
+        payloads = []
+        blobs: List[Any] = []
+        for method, params in calls:
+            payload, payload_blobs = _build_request(next(self._id_gen), method, params, binary)
+            payloads.append(payload)
+            blobs.extend(payload_blobs)
+        # Encode before registering, so an unserializable param leaves no
+        # waiters behind.
+        parts = [_dumps(payloads), DELIM, *blobs]
+        events = [(p["id"], self._register(p["id"])) for p in payloads]
+        self._submit(parts)
+        return events
+
+    def _collect(
+        self,
+        events: List[Tuple[int, threading.Event]],
+        calls: List[Tuple[str, List[Any]]],
+    ) -> List[Any]:
+        try:
+            return self._collect_events(events)
+        finally:
+            # Again after completion, in case a concurrent stat/exists raced
+            # the batch and cached a pre-mutation result.
+            for method, params in calls:
+                self._invalidate_for(method, params)
+
+    def _collect_events(self, events: List[Tuple[int, threading.Event]]) -> List[Any]:
+        deadline = None if self.config.timeout is None else time.monotonic() + self.config.timeout
+        msgs = []
+        try:
+            for msg_id, ev in events:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                msgs.append(self._wait(msg_id, ev, remaining))
+        except BaseException:
+            # Don't leave the rest of the set registered.
+            self._discard([msg_id for msg_id, _ in events])
+            raise
+        return [self._unwrap(msg) for msg in msgs]
+
+
+class CVMPool:
+    """
+    Spreads calls over several CVM bridge processes so CPU-bound bridge work
+    runs on more than one core.
+
+    Every worker owns its own, independent VirtualFS, and calls are routed
+    by hashing the normalized path in their first parameter, so all
+    operations on the same path reach the same worker. A path and its
+    parent usually live on different workers, which breaks directory
+    semantics: after createFile("/d/f1") and createFile("/d/f2"),
+    exists("/d") may be False and readdir("/d") may list neither file.
+    Only use a pool for workloads that never rely on directories.
+
+    A rename whose two paths hash to different workers raises RuntimeError.
+    `load` (through `call`) is sent to every worker, so each starts from
+    the same tree. Any other call without a path, e.g. `save`, has no
+    single worker holding the answer and raises RuntimeError.
+    """
+
+    def __init__(self, config: CVMConfig, workers: Optional[int] = None):
+        count = workers or os.cpu_count() or 1
+        self.workers = [CVM(config) for _ in range(count)]
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+    def _worker_for(self, path: str) -> CVM:
+        return self.workers[hash(_normpath(path)) % len(self.workers)]
+
+    def _route(self, method: str, params: List[Any]) -> CVM:
+        if method in BROADCAST_METHODS:
+            raise RuntimeError(f"{method} must be sent on its own through CVMPool.call")
+        if not params or not isinstance(params[0], str):
+            raise RuntimeError(f"Cannot route {method}: it has no path to pick a pool worker by")
+        worker = self._worker_for(params[0])
+        if (
+            method in RENAME_METHODS
+            and len(params) > 1
+            and isinstance(params[1], str)
+            and self._worker_for(params[1]) is not worker
+        ):
+            raise RuntimeError(
+                f"Cannot rename {params[0]!r} to {params[1]!r}: "
+                "the paths belong to different pool workers"
+            )
+        return worker
+
+    def call(self, method: str, params: List[Any], binary: bool = False) -> Any:
+        """
+        Generic RPC call, routed to one worker (or sent to every worker for
+        BROADCAST_METHODS).
+        """
+        if method in BROADCAST_METHODS:
+            results = [worker.call(method, params, binary) for worker in self.workers]
+            return results[0]
+        return self._route(method, params).call(method, params, binary)
+
+    def call_many(self, calls: List[Tuple[str, List[Any]]], binary: bool = False) -> List[Any]:
+        """
+        Like CVM.call_many, but the batch is split per worker and all the
+        sub-batches are in flight at once. Results keep the order of `calls`;
+        if any sub-batch fails, every worker is still drained before the
+        first error is raised.
+        """
+        groups: Dict[int, Tuple[CVM, List[int], List[Tuple[str, List[Any]]]]] = {}
+        for i, (method, params) in enumerate(calls):
+            worker = self._route(method, params)
+            _, indices, sub_calls = groups.setdefault(id(worker), (worker, [], []))
+            indices.append(i)
+            sub_calls.append((method, params))
+        submitted = []
+        try:
+            for worker, indices, sub_calls in groups.values():
+                events = worker._submit_many(sub_calls, binary)
+                submitted.append((worker, indices, sub_calls, events))
+        except BaseException:
+            # Unregister the sub-batches that already went out.
+            for worker, _, _, events in submitted:
+                worker._discard([msg_id for msg_id, _ in events])
+            raise
+        results: List[Any] = [None] * len(calls)
+        errors = []
+        for worker, indices, sub_calls, events in submitted:
+            try:
+                for i, result in zip(indices, worker._collect(events, sub_calls)):
+                    results[i] = result
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return results
+
+
+class AsyncCVM:
+    """
+    asyncio counterpart of CVM: one bridge process driven from the event
+    loop, with each call awaiting a Future resolved by a reader task.
+    Create it with `await AsyncCVM.start(config)`; it must only be used
+    from the loop that started it.
+    """
+
+    def __init__(self, config: CVMConfig):
+        self.config = config
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self._id_gen = itertools.count(1)
+        self._waiters: Dict[int, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._reader_task: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    async def start(cls, config: CVMConfig) -> "AsyncCVM":
+        self = cls(config)
+        self.proc = await asyncio.create_subprocess_exec(
+            self.config.node_path,
+            self.config.bridge_js,
+            cwd=self.config.cwd,
+            env=self.config.env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._reader_task = asyncio.get_running_loop().create_task(self._reader_loop())
+        return self
+
+    async def close(self):
+        if self.proc and self.proc.returncode is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.terminate()
+            except Exception:
+                pass
+            await self.proc.wait()
+        if self._reader_task is not None:
+            await self._reader_task
+
+    async def __aenter__(self) -> "AsyncCVM":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _reader_loop(self):
+        decoder = _FrameDecoder()
+        while True:
+            chunk = await self.proc.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            for reply in decoder.feed(chunk):
+                fut = self._waiters.pop(reply.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(reply)
+        # Bridge is gone: fail everyone still waiting.
+        waiters = list(self._waiters.values())
+        self._waiters.clear()
+        for fut in waiters:
+            if not fut.done():
+                fut.set_exception(RuntimeError("Bridge closed before responding"))
+
+    async def _send(self, payload: Any, blobs: List[Any]):
+        if self.proc is None or self.proc.stdin is None:
+            raise RuntimeError("Bridge stdin not available")
+        if self._reader_task is None or self._reader_task.done():
+            raise RuntimeError("Bridge closed before responding")
+        self.proc.stdin.writelines((_dumps(payload), DELIM, *blobs))
+        await self.proc.stdin.drain()
+
+    async def call(self, method: str, params: List[Any], binary: bool = False) -> Any:
+        """
+        Generic RPC call into the Node bridge; bytes-like params and
+        `binary` behave as in CVM.call.
+        """
+        payload, blobs = _build_request(next(self._id_gen), method, params, binary)
+        msg_id = payload["id"]
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[msg_id] = fut
+        try:
+            await self._send(payload, blobs)
+            msg = await asyncio.wait_for(fut, self.config.timeout)
+        finally:
+            self._waiters.pop(msg_id, None)
+        return CVM._unwrap(msg)
+
+    async def call_many(self, calls: List[Tuple[str, List[Any]]], binary: bool = False) -> List[Any]:
+        """
+        Batch counterpart of `call`; see CVM.call_many.
+        """
+        if not calls:
+            return []
+        loop = asyncio.get_running_loop()
+        payloads = []
+        blobs: List[Any] = []
+        for method, params in calls:
+            payload, call_blobs = _build_request(next(self._id_gen), method, params, binary)
+            payloads.append(payload)
+            blobs.extend(call_blobs)
+        futs = []
+        for payload in payloads:
+            fut = loop.create_future()
+            self._waiters[payload["id"]] = fut
+            futs.append(fut)
+        try:
+            await self._send(payloads, blobs)
+            msgs = await asyncio.wait_for(asyncio.gather(*futs), self.config.timeout)
+        finally:
+            for payload in payloads:
+                self._waiters.pop(payload["id"], None)
+        return [CVM._unwrap(msg) for msg in msgs]
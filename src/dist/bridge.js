@@ -1,6 +1,18 @@
 // dist/bridge.js
+const net = require("net");
 const { methods } = require("./virtualfs.js");
 
+const DELIM = "\n\n";
+
+// When the host passes a socketpair end as --fd=N, speak the protocol over
+// it (full duplex, and stdout stays free for logging); otherwise use stdio.
+const fdArg = process.argv.find((arg) => arg.startsWith("--fd="));
+const channel = fdArg
+  ? new net.Socket({ fd: Number(fdArg.slice("--fd=".length)), readable: true, writable: true })
+  : null;
+const input = channel ?? process.stdin;
+const output = channel ?? process.stdout;
+
 // JSON replacer to serialize Date
 function replacer(_key, value) {
   if (value instanceof Date) return value.toISOString();
@@ -23,43 +35,162 @@ function reviveDates(obj) {
   return obj;
 }
 
-process.stdin.setEncoding("utf8");
-
-let buffer = "";
-process.stdin.on("data", async (chunk) => {
-  buffer += chunk;
-  // Messages are delimited by \n\n (double newline)
-  while (true) {
-    const idx = buffer.indexOf("\n\n");
-    if (idx === -1) break;
-    const raw = buffer.slice(0, idx);
-    buffer = buffer.slice(idx + 2);
-    let msg;
-    try {
-      msg = JSON.parse(raw);
-    } catch (e) {
-      const err = { id: null, error: { message: "Invalid JSON", details: String(e) } };
-      process.stdout.write(JSON.stringify(err) + "\n\n");
-      continue;
+// Raw bytes sent after a response frame; JSON.stringify skips symbol keys
+const BLOB = Symbol("blob");
+// Set on a request whose attachment could not be decoded
+const BAD_ATTACHMENT = Symbol("badAttachment");
+
+// Run a single request and build its response object
+async function handle(msg) {
+  const { id, method, params, binary } = msg ?? {};
+  if (msg?.[BAD_ATTACHMENT]) {
+    return { id, error: { message: msg[BAD_ATTACHMENT] } };
+  }
+  if (!methods[method]) {
+    return { id, error: { message: `Unknown method ${method}` } };
+  }
+  try {
+    const revivedParams = Array.isArray(params) ? params.map(reviveDates) : reviveDates(params);
+    const result = await methods[method](...(Array.isArray(revivedParams) ? revivedParams : [revivedParams]));
+    // Binary results go out-of-band: { id, binlen } followed by the bytes
+    if (binary && (typeof result === "string" || Buffer.isBuffer(result))) {
+      const blob = Buffer.isBuffer(result) ? result : Buffer.from(result, "utf8");
+      return { id, binlen: blob.length, [BLOB]: blob };
     }
+    return { id, result };
+  } catch (e) {
+    return { id, error: { message: e.message ?? String(e) } };
+  }
+}
+
+// Total attachment bytes announced by a request (or batch) via `bin`
+function attachmentLength(msg) {
+  let total = 0;
+  for (const req of Array.isArray(msg) ? msg : [msg]) {
+    for (const [, size] of req?.bin ?? []) total += size;
+  }
+  return total;
+}
+
+// Put attachments back into params; VirtualFS content is text, so decode it.
+// Invalid UTF-8 fails the request instead of being replaced with U+FFFD.
+const UTF8 = new TextDecoder("utf-8", { fatal: true });
+
+function attach(msg, blob) {
+  let offset = 0;
+  for (const req of Array.isArray(msg) ? msg : [msg]) {
+    for (const [index, size] of req?.bin ?? []) {
+      try {
+        req.params[index] = UTF8.decode(blob.subarray(offset, offset + size));
+      } catch (e) {
+        req[BAD_ATTACHMENT] = `Parameter ${index} is not valid UTF-8`;
+      }
+      offset += size;
+    }
+  }
+}
 
-    const { id, method, params } = msg;
-    if (!methods[method]) {
-      process.stdout.write(JSON.stringify({ id, error: { message: `Unknown method ${method}` } }) + DELIM);
+// Parse one frame, reporting invalid JSON to the host
+function parse(raw) {
+  try {
+    return JSON.parse(raw.toString("utf8"));
+  } catch (e) {
+    const err = { id: null, error: { message: "Invalid JSON", details: String(e) } };
+    output.write(JSON.stringify(err) + DELIM);
+    return undefined;
+  }
+}
+
+// Serialize one response; a result that can't be serialized becomes an
+// error for the same id, so the caller isn't left waiting
+function encode(res) {
+  try {
+    return JSON.stringify(res, replacer);
+  } catch (e) {
+    delete res[BLOB];
+    return JSON.stringify({ id: res.id, error: { message: e.message ?? String(e) } });
+  }
+}
+
+// Run one request (or batch) and write its response plus any attachments
+function dispatch(msg) {
+  // A JSON array is a batch: answer with one array of responses.
+  // Requests are started in order, so synchronous methods keep their order.
+  const pending = Array.isArray(msg) ? Promise.all(msg.map(handle)) : handle(msg);
+  pending.then((response) => {
+    const responses = Array.isArray(response) ? response : [response];
+    const body = responses.map(encode).join(",");
+    output.write((Array.isArray(response) ? `[${body}]` : body) + DELIM);
+    for (const res of responses) {
+      if (res[BLOB]) output.write(res[BLOB]);
+    }
+  });
+}
+
+// Input is consumed as raw Buffers: only complete frames are decoded, and
+// each chunk is scanned for the delimiter once. A frame announcing `bin`
+// attachments is followed by that many raw bytes, collected before dispatch.
+const DELIM_B = Buffer.from(DELIM);
+const NEWLINE = DELIM_B[0];
+const EMPTY = Buffer.alloc(0);
+let partial = [];
+let partialLength = 0;
+let waiting = null; // { msg, need } while reading attachments
+
+function takeFrame(tail) {
+  const raw = partial.length ? Buffer.concat([...partial, tail]) : tail;
+  partial = [];
+  partialLength = 0;
+  const msg = parse(raw);
+  if (msg === undefined) return;
+  const need = attachmentLength(msg);
+  if (need > 0) {
+    waiting = { msg, need };
+    return;
+  }
+  attach(msg, EMPTY); // zero-length attachments, if any
+  dispatch(msg);
+}
+
+input.on("data", (chunk) => {
+  let from = 0;
+  while (from < chunk.length) {
+    if (waiting) {
+      const take = Math.min(waiting.need - partialLength, chunk.length - from);
+      partial.push(chunk.subarray(from, from + take));
+      partialLength += take;
+      from += take;
+      if (partialLength === waiting.need) {
+        const { msg } = waiting;
+        attach(msg, Buffer.concat(partial, partialLength));
+        partial = [];
+        partialLength = 0;
+        waiting = null;
+        dispatch(msg);
+      }
+      continue;
+    }
+    // Delimiter split across the previous chunk and this one
+    const last = partial[partial.length - 1];
+    if (last && last[last.length - 1] === NEWLINE && chunk[from] === NEWLINE) {
+      partial[partial.length - 1] = last.subarray(0, last.length - 1);
+      from += 1;
+      takeFrame(EMPTY);
       continue;
     }
-  
-    try {
-      const revivedParams = Array.isArray(params) ? params.map(reviveDates) : reviveDates(params);
-      const result = await methods[method](...(Array.isArray(revivedParams) ? revivedParams : [revivedParams]));
-      const payload = { id, result };
-      process.stdout.write(JSON.stringify(payload, replacer) + "\n\n");
-    } catch (e) {
-      process.stdout.write(JSON.stringify({ id, error: { message: e.message ?? String(e) } }) + "\n\n");
+    // Messages are delimited by \n\n (double newline)
+    const idx = chunk.indexOf(DELIM_B, from);
+    if (idx === -1) {
+      partial.push(chunk.subarray(from));
+      partialLength += chunk.length - from;
+      break;
     }
+    const tail = chunk.subarray(from, idx);
+    from = idx + DELIM_B.length;
+    takeFrame(tail);
   }
 });
 
 process.on("uncaughtException", (e) => {
-  process.stdout.write(JSON.stringify({ id: null, error: { message: e.message ?? String(e) } }) + "\n\n");
+  output.write(JSON.stringify({ id: null, error: { message: e.message ?? String(e) } }) + DELIM);
 });
@@ -0,0 +1,341 @@
+# test_cvm.py
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "dev", "cassitly"))
+
+from cvm import AsyncCVM, CVM, CVMConfig, CVMPool, _build_request, _FrameDecoder  # noqa: E402
+
+NODE = shutil.which("node")
+BRIDGE_JS = os.path.join(ROOT, "src", "dist", "bridge.js")
+
+# Stand-in for the compiled VirtualFS module the bridge loads: same method
+# names and path handling (createFile creates missing parents), kept flat so
+# the tests only exercise the bridge and CVM.
+FAKE_VIRTUALFS = r"""
+const nodes = new Map([["/", { dir: true }]]);
+const norm = (p) => "/" + p.split("/").filter(Boolean).join("/");
+const parent = (p) => p.slice(0, p.lastIndexOf("/")) || "/";
+function mkdirs(p) {
+  for (; !nodes.has(p); p = parent(p)) nodes.set(p, { dir: true });
+}
+function file(p) {
+  const node = nodes.get(norm(p));
+  if (!node || node.dir) throw new Error("File not found");
+  return node;
+}
+exports.methods = {
+  createFile(p, content) {
+    p = norm(p);
+    if (nodes.has(p)) throw new Error("File already exists");
+    mkdirs(parent(p));
+    nodes.set(p, { content });
+  },
+  mkdir: (p) => mkdirs(norm(p)),
+  readFile: (p) => file(p).content,
+  writeFile(p, content) { file(p).content = content; },
+  appendFile(p, content) { file(p).content += content; },
+  exists: (p) => nodes.has(norm(p)),
+  stat(p) {
+    const node = nodes.get(norm(p));
+    if (!node) throw new Error("Path not found");
+    return { type: node.dir ? "dir" : "file", size: node.dir ? 0 : node.content.length };
+  },
+  rename(a, b) {
+    a = norm(a);
+    b = norm(b);
+    if (!nodes.has(a)) throw new Error("Node not found");
+    mkdirs(parent(b));
+    for (const [k, v] of [...nodes]) {
+      if (k === a || k.startsWith(a + "/")) {
+        nodes.delete(k);
+        nodes.set(b + k.slice(a.length), v);
+      }
+    }
+  },
+  save: () => JSON.stringify([...nodes]),
+  load(json) {
+    nodes.clear();
+    for (const [k, v] of JSON.parse(json)) nodes.set(k, v);
+  },
+  bigint: () => 10n,
+};
+"""
+
+
+def setUpModule():
+    global BRIDGE_DIR
+    BRIDGE_DIR = tempfile.mkdtemp()
+    shutil.copy(BRIDGE_JS, BRIDGE_DIR)
+    with open(os.path.join(BRIDGE_DIR, "virtualfs.js"), "w") as f:
+        f.write(FAKE_VIRTUALFS)
+
+
+def tearDownModule():
+    shutil.rmtree(BRIDGE_DIR, ignore_errors=True)
+
+
+def shut_down(client: CVM):
+    client.close()
+    client.proc.wait()
+    client._reader_thread.join()
+    for pipe in (client.proc.stdout, client.proc.stderr):
+        if pipe is not None:
+            pipe.close()
+
+
+def make_config(**kwargs) -> CVMConfig:
+    kwargs.setdefault("timeout", 10)
+    return CVMConfig(node_path=NODE, bridge_js=os.path.join(BRIDGE_DIR, "bridge.js"), **kwargs)
+
+
+class FrameDecoderTest(unittest.TestCase):
+    def feed_all(self, decoder, chunks):
+        return [reply for chunk in chunks for reply in decoder.feed(chunk)]
+
+    def test_delimiter_split_across_chunks(self):
+        decoder = _FrameDecoder()
+        self.assertEqual(self.feed_all(decoder, [b'{"id":1,"result":2}\n']), [])
+        self.assertEqual(self.feed_all(decoder, [b'\n{"id":2']), [{"id": 1, "result": 2}])
+        self.assertEqual(self.feed_all(decoder, [b"}\n", b"\n"]), [{"id": 2}])
+
+    def test_byte_by_byte(self):
+        stream = b'{"id":1}\n\n[{"id":2},{"id":3}]\n\n'
+        replies = self.feed_all(_FrameDecoder(), [stream[i:i + 1] for i in range(len(stream))])
+        self.assertEqual([r["id"] for r in replies], [1, 2, 3])
+
+    def test_binlen_attachment_containing_delimiter(self):
+        blob = b"a\n\nb\n\n"
+        stream = b'{"id":1,"binlen":%d}\n\n' % len(blob) + blob + b'{"id":2,"result":null}\n\n'
+        for size in (1, 3, len(stream)):
+            replies = self.feed_all(_FrameDecoder(), [stream[i:i + size] for i in range(0, len(stream), size)])
+            self.assertEqual(replies, [{"id": 1, "binlen": len(blob), "result": blob}, {"id": 2, "result": None}])
+
+    def test_batch_with_binlen_replies(self):
+        stream = b'[{"id":1,"binlen":2},{"id":2,"result":true},{"id":3,"binlen":3}]\n\n' + b"\n\n" + b"xyz"
+        replies = self.feed_all(_FrameDecoder(), [stream[:10], stream[10:-2], stream[-2:]])
+        self.assertEqual([r["result"] for r in replies], [b"\n\n", True, b"xyz"])
+
+    def test_invalid_frame_is_skipped(self):
+        replies = self.feed_all(_FrameDecoder(), [b'not json\n\n{"id":1}\n\n'])
+        self.assertEqual(replies, [{"id": 1}])
+
+
+class BuildRequestTest(unittest.TestCase):
+    def test_bytes_params_become_attachments(self):
+        payload, blobs = _build_request(7, "writeFile", ["/f", b"abc", "x", bytearray(b"de")], binary=True)
+        self.assertEqual(payload["params"], ["/f", None, "x", None])
+        self.assertEqual(payload["bin"], [[1, 3], [3, 2]])
+        self.assertTrue(payload["binary"])
+        self.assertEqual([bytes(b) for b in blobs], [b"abc", b"de"])
+
+    def test_strided_memoryview_is_flattened(self):
+        payload, blobs = _build_request(1, "writeFile", ["/f", memoryview(b"abcdef")[::2]])
+        self.assertEqual(payload["bin"], [[1, 3]])
+        self.assertEqual(blobs, [b"ace"])
+
+
+@unittest.skipUnless(NODE, "node is not installed")
+class RawBridgeTest(unittest.TestCase):
+    """
+    Drive the bridge over stdio directly, writing one byte at a time so
+    delimiters and attachments are split across input chunks.
+    """
+
+    def test_split_frames_and_attachments(self):
+        proc = subprocess.Popen(
+            [NODE, os.path.join(BRIDGE_DIR, "bridge.js")],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.addCleanup(proc.stdout.close)
+        self.addCleanup(proc.wait)
+        self.addCleanup(proc.kill)
+        blob = "é\n\nx".encode()
+        stream = (
+            b'{"id":1,"method":"createFile","params":["/f",null],"bin":[[1,%d]]}\n\n' % len(blob)
+            + blob
+            + b'[{"id":2,"method":"readFile","params":["/f"],"binary":true},{"id":3,"method":"exists","params":["/f"]}]\n\n'
+        )
+        for i in range(len(stream)):
+            proc.stdin.write(stream[i:i + 1])
+            proc.stdin.flush()
+            time.sleep(0.0005)
+        proc.stdin.close()
+        replies = list(_FrameDecoder().feed(proc.stdout.read()))
+        self.assertEqual(
+            sorted(replies, key=lambda r: r["id"]),
+            [
+                {"id": 1},
+                {"id": 2, "binlen": len(blob), "result": blob},
+                {"id": 3, "result": True},
+            ],
+        )
+
+
+@unittest.skipUnless(NODE, "node is not installed")
+class CVMTest(unittest.TestCase):
+    use_socketpair = True
+
+    def setUp(self):
+        self.cvm = CVM(make_config(use_socketpair=self.use_socketpair, stat_cache_ttl=60))
+        self.addCleanup(shut_down, self.cvm)
+
+    def pending(self):
+        return sum(len(s.waiters) + len(s.results) for s in self.cvm._shards)
+
+    def test_binary_attachment_roundtrip(self):
+        data = "héllo\n\nworld".encode()
+        self.cvm.call("createFile", ["/f", data])
+        self.assertEqual(self.cvm.call("readFile", ["/f"]), data.decode())
+        self.assertEqual(self.cvm.call("readFile", ["/f"], binary=True), data)
+
+    def test_batch_with_attachments(self):
+        results = self.cvm.call_many(
+            [("createFile", ["/a", b"\n\n1"]), ("createFile", ["/b", b"2"]), ("readFile", ["/a"])],
+            binary=True,
+        )
+        self.assertEqual(results, [None, None, b"\n\n1"])
+
+    def test_invalid_utf8_fails_only_that_request(self):
+        self.cvm.call("createFile", ["/f", ""])
+        with self.assertRaisesRegex(RuntimeError, "not valid UTF-8"):
+            self.cvm.call("writeFile", ["/f", b"ok\xff"])
+        with self.assertRaisesRegex(RuntimeError, "not valid UTF-8"):
+            self.cvm.call_many([("writeFile", ["/f", b"\xc3"]), ("appendFile", ["/f", b"x"])])
+        self.assertEqual(self.cvm.call("readFile", ["/f"]), "x")
+
+    def test_unserializable_result_is_an_error(self):
+        with self.assertRaises(RuntimeError):
+            self.cvm.call("bigint", [])
+        self.assertTrue(self.cvm.call("exists", ["/"]))
+
+    def test_large_batch_keeps_every_result(self):
+        # Regression: a stale-result sweep used to drop results of big batches.
+        self.assertEqual(self.cvm.call_many([("exists", ["/"])] * 2000), [True] * 2000)
+        self.assertEqual(self.pending(), 0)
+
+    def test_unserializable_batch_leaves_no_waiters(self):
+        for _ in range(3):
+            with self.assertRaises(TypeError):
+                self.cvm.call_many([("exists", ["/"]), ("exists", [{1}])])
+        self.assertEqual(self.pending(), 0)
+
+    def test_strided_memoryview_param(self):
+        self.cvm.call("createFile", ["/f", memoryview(b"abcdef")[::2]])
+        self.assertEqual(self.cvm.call("readFile", ["/f"]), "ace")
+        self.assertTrue(self.cvm._writer_thread.is_alive())
+
+    def test_writer_failure_fails_callers(self):
+        def broken(parts):
+            raise TypeError("broken")
+
+        self.cvm._write_all = broken
+        hook, threading.excepthook = threading.excepthook, lambda args: None
+        self.addCleanup(setattr, threading, "excepthook", hook)
+        with self.assertRaisesRegex(RuntimeError, "Bridge closed"):
+            self.cvm.call("exists", ["/"])
+        with self.assertRaisesRegex(RuntimeError, "Bridge closed"):
+            self.cvm.call("exists", ["/"])
+        self.cvm._writer_thread.join(5)
+
+    def test_call_after_close(self):
+        self.cvm.close()
+        self.cvm._reader_thread.join(5)
+        with self.assertRaisesRegex(RuntimeError, "Bridge closed"):
+            self.cvm.call("exists", ["/"])
+
+    def test_batch_appends_to_aliases_keep_order(self):
+        self.cvm.call("createFile", ["/f", ""])
+        with self.cvm.batch_appends():
+            self.cvm.call("appendFile", ["/f", "1"])
+            self.cvm.call("appendFile", ["f", "2"])
+            self.cvm.call("appendFile", ["//f", "3"])
+        self.assertEqual(self.cvm.call("readFile", ["/f"]), "123")
+
+    def test_create_invalidates_ancestors(self):
+        self.assertFalse(self.cvm.call("exists", ["/d"]))
+        self.assertFalse(self.cvm.call("exists", ["/d/e"]))
+        self.cvm.call("createFile", ["/d/e/f", "x"])
+        self.assertTrue(self.cvm.call("exists", ["/d"]))
+        self.assertTrue(self.cvm.call("exists", ["d/e"]))
+
+    def test_mkdir_invalidates_ancestors(self):
+        self.assertFalse(self.cvm.call("exists", ["/a"]))
+        self.cvm.call("mkdir", ["/a/b"])
+        self.assertTrue(self.cvm.call("exists", ["/a"]))
+
+    def test_rename_invalidates_subtrees(self):
+        self.cvm.call("createFile", ["/src/x", "1"])
+        self.assertTrue(self.cvm.call("exists", ["/src/x"]))
+        self.assertFalse(self.cvm.call("exists", ["/dst/x"]))
+        self.cvm.call("rename", ["/src", "/dst"])
+        self.assertFalse(self.cvm.call("exists", ["/src/x"]))
+        self.assertTrue(self.cvm.call("exists", ["/dst/x"]))
+
+    def test_invalidation_during_call_blocks_caching(self):
+        key = ("exists", "/p")
+        gen = self.cvm._cache_gen
+        self.cvm.invalidate("/p")
+        self.cvm._cache_put(key, False, gen)
+        self.assertEqual(self.cvm._cache_get(key), (False, None))
+        self.cvm._cache_put(key, False, self.cvm._cache_gen)
+        self.assertEqual(self.cvm._cache_get(key), (True, False))
+
+
+class PipeCVMTest(CVMTest):
+    use_socketpair = False
+
+
+@unittest.skipUnless(NODE, "node is not installed")
+class CVMPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = CVMPool(make_config(), workers=4)
+        for worker in self.pool.workers:
+            self.addCleanup(shut_down, worker)
+
+    def test_pathless_calls_are_rejected(self):
+        with self.assertRaises(RuntimeError):
+            self.pool.call("save", [])
+        with self.assertRaises(RuntimeError):
+            self.pool.call_many([("load", ["[]"])])
+
+    def test_load_reaches_every_worker(self):
+        tree = '[["/",{"dir":true}],["/f",{"content":"x"}]]'
+        self.pool.call("load", [tree])
+        for worker in self.pool.workers:
+            self.assertEqual(worker.call("readFile", ["/f"]), "x")
+
+    def test_same_path_same_worker(self):
+        self.pool.call_many([("createFile", [f"/f{i}", str(i)]) for i in range(20)])
+        self.assertEqual(
+            self.pool.call_many([("readFile", [f"f{i}"]) for i in range(20)]),
+            [str(i) for i in range(20)],
+        )
+
+
+@unittest.skipUnless(NODE, "node is not installed")
+class AsyncCVMTest(unittest.TestCase):
+    def test_binary_params_and_results(self):
+        async def main():
+            async with await AsyncCVM.start(make_config()) as client:
+                await client.call("createFile", ["/f", b"h\xc3\xa9\n\n"])
+                self.assertEqual(await client.call("readFile", ["/f"]), "hé\n\n")
+                self.assertEqual(
+                    await client.call_many([("readFile", ["/f"]), ("exists", ["/f"])], binary=True),
+                    [b"h\xc3\xa9\n\n", True],
+                )
+
+        asyncio.run(main())
+
+
+if __name__ == "__main__":
+    unittest.main()